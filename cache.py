@@ -0,0 +1,77 @@
+"""
+Small on-disk TTL cache for API responses
+=========================================
+- Entries are pickled to .cache/<namespace>/<endpoint>-<md5(params)>.pkl
+- Each entry stores its own timestamp and ttl_seconds
+- Expired or unreadable entries are treated as a miss and re-fetched
+- Cache errors are logged and never fail the fetch they wrap
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FileCache:
+    def __init__(self, root=".cache"):
+        self.root = root
+
+    def _path(self, namespace, endpoint, params):
+        digest = hashlib.md5(repr(params).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, namespace, f"{endpoint}-{digest}.pkl")
+
+    def get(self, namespace, endpoint, params):
+        """Return the cached value, or None if missing or expired."""
+        path = self._path(namespace, endpoint, params)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            expired = time.time() - entry["timestamp"] > entry["ttl_seconds"]
+            value = entry["value"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # e.g. pickled under another alpaca-py/pydantic version; drop it so it gets rewritten
+            logger.warning("⚠️ Discarding unreadable cache entry %s: %s", path, e)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        return None if expired else value
+
+    def set(self, namespace, endpoint, params, value, ttl_seconds):
+        path = self._path(namespace, endpoint, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        entry = {"timestamp": time.time(), "ttl_seconds": ttl_seconds, "value": value}
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_or_fetch(self, namespace, endpoint, params, ttl_seconds, fetch, should_cache=None):
+        """Return the cached value, calling fetch() on a miss.
+
+        The fetched value is stored unless should_cache(value) returns False.
+        """
+        value = self.get(namespace, endpoint, params)
+        if value is None:
+            value = fetch()
+            if should_cache is None or should_cache(value):
+                try:
+                    self.set(namespace, endpoint, params, value, ttl_seconds)
+                except Exception as e:
+                    logger.warning("⚠️ Failed to write cache entry for %s/%s: %s", namespace, endpoint, e)
+        return value
@@ -1,12 +1,23 @@
+import logging
 import os
+import time
+from itertools import chain, islice
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
 import yfinance as yf
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
 from alpaca.trading.client import TradingClient
 from alpaca.data.historical.option import OptionHistoricalDataClient
 from alpaca.data.requests import OptionSnapshotRequest
 from alpaca.trading.requests import GetOptionContractsRequest
 from alpaca.trading.enums import AssetStatus
+from cache import FileCache
 
 # Alpaca API keys
 API_KEY = os.getenv("ALPACA_API_KEY")
@@ -16,121 +27,246 @@ SECRET_KEY = os.getenv("ALPACA_SECRET_KEY")
 trading_client = TradingClient(API_KEY, SECRET_KEY, paper=True)
 option_client = OptionHistoricalDataClient(API_KEY, SECRET_KEY)
 
+# Tickers are fetched concurrently; the work is almost entirely HTTP latency
+MAX_WORKERS = 8
+SNAPSHOT_BATCH_SIZE = 20
+SNAPSHOT_WORKERS = 5
+# Limit for free tier. One request returns every contract up to this limit, so snapshot
+# batches have no later contract page to overlap with; streaming pages into the snapshot
+# pool only pays off if this ever grows beyond one Alpaca page.
+CONTRACT_LIMIT = 50
+
+# Results go to a Parquet dataset partitioned by snapshot_date/ticker; "csv" writes one file per ticker
+OUTPUT_FORMAT = os.getenv("OPTIONS_OUTPUT_FORMAT", "parquet")
+OUTPUT_DIR = "alpaca_options"
+
+# Warm reruns read Alpaca responses from disk instead of the network
+api_cache = FileCache(os.getenv("OPTIONS_CACHE_DIR", ".cache"))
+CONTRACTS_TTL_SECONDS = 24 * 60 * 60
+SNAPSHOT_TTL_SECONDS = 10 * 60
+
+# Every ticker worker can have SNAPSHOT_WORKERS requests in flight on the shared clients
+HTTP_POOL_MAXSIZE = MAX_WORKERS * SNAPSHOT_WORKERS
+
+def mount_connection_pool(client, pool_maxsize: int = HTTP_POOL_MAXSIZE) -> None:
+    """Enlarge the connection pool on an Alpaca client's requests.Session."""
+    session = getattr(client, '_session', None)
+    if session is None:
+        return
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_maxsize,
+                          max_retries=Retry(total=3, backoff_factor=0.2))
+    session.mount('https://', adapter)
+
+mount_connection_pool(trading_client)
+mount_connection_pool(option_client)
+
+logger = logging.getLogger(__name__)
+
+# Prices are memoized for PRICE_TTL_SECONDS. A fresh yf.Ticker is built on every miss,
+# because a Ticker's fast_info keeps its first last_price for the object's lifetime.
+PRICE_TTL_SECONDS = 60
+FALLBACK_PRICE = 90.0  # returned when Yahoo has no price; never cached
+_PRICE_CACHE: dict[str, tuple[float, float]] = {}
+
 def get_current_price_yf(ticker: str) -> float:
     """Fetch the latest market price from Yahoo Finance."""
+    cached = _PRICE_CACHE.get(ticker)
+    if cached and time.monotonic() - cached[0] < PRICE_TTL_SECONDS:
+        return cached[1]
+
     try:
         ticker_obj = yf.Ticker(ticker)
         price = ticker_obj.fast_info.last_price
         if price is None or price <= 0:
             price = ticker_obj.history(period="1d")["Close"].iloc[-1]
-        return float(price)
+        price = float(price)
+        _PRICE_CACHE[ticker] = (time.monotonic(), price)
+        return price
+    except Exception as e:
+        logger.warning("⚠️ Failed to fetch current price for %s: %s", ticker, e)
+        return FALLBACK_PRICE
+
+def prefetch_prices(tickers) -> dict:
+    """Fetch last closes for a list of tickers in one bulk download and seed the price cache."""
+    try:
+        data = yf.download(tickers, period="1d", group_by="ticker", threads=True, progress=False)
+    except Exception as e:
+        logger.warning("⚠️ Bulk price download failed: %s", e)
+        return {}
+
+    prices = {}
+    fetched_at = time.monotonic()
+    for ticker in tickers:
+        try:
+            close = data[ticker]["Close"].dropna()
+        except KeyError:
+            continue  # get_current_price_yf falls back to a per-ticker lookup
+        if close.empty:
+            continue
+
+        prices[ticker] = float(close.iloc[-1])
+        _PRICE_CACHE[ticker] = (fetched_at, prices[ticker])
+
+    return prices
+
+def iter_option_contract_pages(req: GetOptionContractsRequest):
+    """Yield each page of contracts for req, following next_page_token."""
+    while True:
+        result = trading_client.get_option_contracts(req)
+        yield result.option_contracts
+        if not result.next_page_token:
+            return
+        req = req.model_copy(update={'page_token': result.next_page_token})
+
+def fetch_option_contracts(req: GetOptionContractsRequest, limit: int = CONTRACT_LIMIT) -> list:
+    """Return up to limit option contracts matching req; later pages are never requested."""
+    return list(islice(chain.from_iterable(iter_option_contract_pages(req)), limit))
+
+def fetch_snapshot_batch(ticker: str, batch_no: int, batch: list) -> dict:
+    """Fetch snapshots for one batch of option symbols; failures yield an empty dict."""
+    try:
+        return api_cache.get_or_fetch(
+            ticker, "snapshots", tuple(batch), SNAPSHOT_TTL_SECONDS,
+            lambda: option_client.get_option_snapshot(OptionSnapshotRequest(symbol_or_symbols=batch))
+        )
     except Exception as e:
-        print(f"⚠️ Failed to fetch current price for {ticker}: {e}")
-        return 90.0  # fallback value
+        logger.warning("⚠️ Batch %d failed for %s: %s", batch_no, ticker, e)
+        return {}
+
+# Low-cardinality strings as categories, contract codes as Arrow-backed strings
+COLUMN_DTYPES = {'ticker': 'category', 'type': 'category', 'option_code': 'string[pyarrow]'}
+
+SNAPSHOT_FIELDS = ['bid', 'ask', 'last_price', 'volume', 'open_interest', 'iv']
+
+def flatten_snapshot(snap) -> tuple:
+    """Return the SNAPSHOT_FIELDS values from an option snapshot."""
+    quote = snap.latest_quote
+    trade = snap.latest_trade
+    return (
+        (quote.bid_price or 0.0) if quote else 0.0,
+        (quote.ask_price or 0.0) if quote else 0.0,
+        (trade.price or 0.0) if trade else 0.0,
+        getattr(snap, 'volume', 0),
+        getattr(snap, 'open_interest', 0),
+        getattr(snap, 'implied_volatility', 0.0) or 0.0,
+    )
 
 def get_options_chain_snapshot(ticker: str, exp_days: int = 30, strike_pct: float = 0.1) -> pd.DataFrame:
     """Return an options chain snapshot for a given ticker."""
     current_price = get_current_price_yf(ticker)
-    print(f"💰 {ticker} current price: {current_price:.2f}")
+    logger.info("💰 %s current price: %.2f", ticker, current_price)
 
-    strike_low = str(current_price * (1 - strike_pct))
-    strike_high = str(current_price * (1 + strike_pct))
-    exp_max = date.today() + timedelta(days=exp_days)
+    # Rounded so the cache key below matches the exact window sent to Alpaca
+    strike_low = round(current_price * (1 - strike_pct), 2)
+    strike_high = round(current_price * (1 + strike_pct), 2)
+    today = date.today()
+    exp_max = today + timedelta(days=exp_days)
 
-    all_contracts = []
     req = GetOptionContractsRequest(
         underlying_symbols=[ticker],
         status=AssetStatus.ACTIVE,
         expiration_date_lte=exp_max,
-        strike_price_gte=strike_low,
-        strike_price_lte=strike_high
+        strike_price_gte=str(strike_low),
+        strike_price_lte=str(strike_high),
+        limit=CONTRACT_LIMIT
     )
 
-    page_token = None
-    while True:
-        if page_token:
-            req.page_token = page_token
-
-        result = trading_client.get_option_contracts(req)
-        if isinstance(result, tuple):
-            contracts, page_token = result
-        else:
-            contracts = result
-            page_token = None
-
-        all_contracts.extend(contracts.option_contracts)
-        if not page_token:
-            break
+    # Empty lists and windows built from the fallback price are not worth keeping for a day
+    price_is_fallback = current_price == FALLBACK_PRICE
+    all_contracts = api_cache.get_or_fetch(
+        ticker, "contracts", (exp_days, strike_low, strike_high, CONTRACT_LIMIT, today),
+        CONTRACTS_TTL_SECONDS, lambda: fetch_option_contracts(req),
+        should_cache=lambda contracts: bool(contracts) and not price_is_fallback
+    )
 
-    print(f"Found {len(all_contracts)} contracts for {ticker}")
+    logger.info("Found %d contracts for %s", len(all_contracts), ticker)
     if not all_contracts:
         return pd.DataFrame()
 
-    symbols = [c.symbol for c in all_contracts[:50]]  # Limit for free tier
+    symbols = [c.symbol for c in all_contracts]
+    batches = [symbols[i:i + SNAPSHOT_BATCH_SIZE] for i in range(0, len(symbols), SNAPSHOT_BATCH_SIZE)]
     all_snaps = {}
 
-    for i in range(0, len(symbols), 20):
-        batch = symbols[i:i + 20]
-        try:
-            snaps = option_client.get_option_snapshot(OptionSnapshotRequest(symbol_or_symbols=batch))
+    with ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS) as executor:
+        for snaps in executor.map(lambda b: fetch_snapshot_batch(ticker, *b), enumerate(batches)):
             all_snaps.update(snaps)
-        except Exception as e:
-            print(f"⚠️ Batch {i//20} failed for {ticker}: {e}")
 
-    data = []
     now = pd.Timestamp.now().tz_localize(None)
-    today = date.today()
 
-    for contract in all_contracts:
-        snap = all_snaps.get(contract.symbol)
-        bid = ask = last_price = volume = open_interest = iv = 0.0
-
-        if snap:
-            if getattr(snap, 'latest_quote', None):
-                bid = snap.latest_quote.bid_price or 0.0
-                ask = snap.latest_quote.ask_price or 0.0
-            if getattr(snap, 'latest_trade', None):
-                last_price = snap.latest_trade.price or 0.0
-            volume = getattr(contract, 'volume', 0) or getattr(snap, 'volume', 0)
-            open_interest = getattr(contract, 'open_interest', 0) or getattr(snap, 'open_interest', 0)
-            iv = getattr(snap, 'implied_volatility', 0.0)
-
-        data.append({
-            'ticker': ticker,
-            'option_code': contract.symbol,
-            'strike': float(contract.strike_price),
-            'exp_date': contract.expiration_date,
-            'type': contract.type.value.upper(),
-            'bid': bid,
-            'ask': ask,
-            'last_price': last_price,
-            'mid_price': (bid + ask) / 2 if bid > 0 or ask > 0 else 0.0,
-            'volume': int(volume),
-            'open_interest': int(open_interest),
-            'iv': iv,
-            'timestamp': now,
-            'snapshot_date': today
-        })
-
-    return pd.DataFrame(data, columns=[
-        'ticker', 'option_code', 'strike', 'exp_date', 'type',
-        'bid', 'ask', 'last_price', 'mid_price', 'volume',
-        'open_interest', 'iv', 'timestamp', 'snapshot_date'
-    ])
-
-def fetch_multiple_tickers(ticker_list, exp_days=45, strike_pct=0.3):
-    """Iterate through tickers and save options chains to CSV."""
-    for ticker in ticker_list:
-        print(f"\n🔄 Fetching {ticker} options chain...")
-        df = get_options_chain_snapshot(ticker, exp_days=exp_days, strike_pct=strike_pct)
-        if df.empty:
-            print(f"❌ No data for {ticker}.")
-            continue
+    # Unpack each snapshot once, then align them to the contract order as whole columns
+    snaps_flat = {symbol: flatten_snapshot(snap) for symbol, snap in all_snaps.items() if snap}
+    snap_cols = pd.DataFrame.from_dict(snaps_flat, orient='index', columns=SNAPSHOT_FIELDS).reindex(symbols)
+    has_snap = snap_cols['bid'].notna().to_numpy()
+    snap_cols = snap_cols.fillna(0.0).astype(np.float64)
+
+    bid = snap_cols['bid'].to_numpy()
+    ask = snap_cols['ask'].to_numpy()
+    contract_open_interest = pd.to_numeric(
+        pd.Series([c.open_interest for c in all_contracts]), errors='coerce'
+    ).fillna(0).to_numpy()
+    # Contract-level open interest wins, but only for contracts that have a snapshot
+    open_interest = np.where(
+        has_snap,
+        np.where(contract_open_interest > 0, contract_open_interest, snap_cols['open_interest'].to_numpy()),
+        0
+    )
+
+    df = pd.DataFrame({
+        'ticker': ticker,
+        'option_code': symbols,
+        'strike': np.fromiter((float(c.strike_price) for c in all_contracts), dtype=np.float64,
+                              count=len(all_contracts)),
+        'exp_date': [c.expiration_date for c in all_contracts],
+        'type': [c.type.value.upper() for c in all_contracts],
+        'bid': bid,
+        'ask': ask,
+        'last_price': snap_cols['last_price'].to_numpy(),
+        'mid_price': np.where((bid > 0) | (ask > 0), (bid + ask) / 2, 0.0),
+        'volume': snap_cols['volume'].to_numpy(dtype=np.int32),
+        'open_interest': open_interest.astype(np.int32),
+        'iv': snap_cols['iv'].to_numpy(),
+        'timestamp': now,
+        'snapshot_date': today
+    })
+    return df.astype(COLUMN_DTYPES)
+
+def fetch_multiple_tickers(ticker_list, exp_days=45, strike_pct=0.3, max_workers=MAX_WORKERS,
+                           output_format=OUTPUT_FORMAT):
+    """Fetch tickers concurrently and save each options chain as it completes."""
+    ticker_list = list(ticker_list)  # iterated twice: for the price prefetch and the fetch loop
+    prefetch_prices(ticker_list)
+    run_ts = pd.Timestamp.now().strftime('%Y%m%d_%H%M')
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for ticker in ticker_list:
+            logger.info("🔄 Fetching %s options chain...", ticker)
+            future = executor.submit(get_options_chain_snapshot, ticker, exp_days, strike_pct)
+            futures[future] = ticker
+
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                logger.error("❌ Failed to fetch %s: %s", ticker, e)
+                continue
+
+            if df.empty:
+                logger.warning("❌ No data for %s.", ticker)
+                continue
 
-        filename = f"{ticker}_options_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.csv"
-        df.to_csv(filename, index=False)
-        print(f"✅ Saved {len(df)} contracts to {filename}")
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if output_format == "csv":
+                filename = f"{ticker}_options_{run_ts}.csv"
+                pcsv.write_csv(table, filename)
+                logger.info("✅ Saved %d contracts to %s", len(df), filename)
+            else:
+                pq.write_to_dataset(table, root_path=OUTPUT_DIR,
+                                    partition_cols=['snapshot_date', 'ticker'], compression='zstd')
+                logger.info("✅ Saved %d contracts to %s/", len(df), OUTPUT_DIR)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
     tickers = ["CALM", "RKLB", "NFLX", "UBER", "ONDS", "V"]
     fetch_multiple_tickers(tickers)
@@ -2,111 +2,189 @@
 Yahoo Finance Options Chain Data Fetcher (100% FREE) - MULTI TICKER VERSION
 ====================================================================
 - Supports multiple tickers
-- Saves each ticker into its own CSV
-- Filename format: TICKER_YYYYMMDD_HHMMSS.csv
-- Saves to CURRENT DIRECTORY (no hardcoded paths)
+- Appends to a Parquet dataset: yf_options/snapshot_date=YYYY-MM-DD/ticker=SYM/
+- Set OUTPUT_FORMAT = "csv" to save each ticker into its own CSV instead
+- CSV filename format: TICKER_YYYYMMDD_HHMMSS_yf.csv
+- Saves under the CURRENT DIRECTORY (no hardcoded paths)
 """
 
 import yfinance as yf
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-import time
+import logging
+
+# Newer yfinance only accepts curl_cffi sessions; older releases use requests
+try:
+    from curl_cffi import requests as curl_requests
+except ImportError:
+    curl_requests = None
+    import requests
+    from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_session():
+    """Create one keep-alive HTTP session to share across every Yahoo request.
+
+    curl_cffi sessions keep their own libcurl connection cache and expose no pool
+    size; only the requests fallback (older yfinance) is sized explicitly.
+    """
+    if curl_requests is not None:
+        return curl_requests.Session(impersonate="chrome")
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Every expiration frame needs these before it can join the combined chain
+REQUIRED_COLUMNS = ["contractSymbol", "strike", "bid", "ask"]
 
 
 class YahooOptionsChainFetcher:
-    def __init__(self):
-        pass
+    def __init__(self, max_workers=6):
+        self.max_workers = max_workers   # expirations fetched concurrently per ticker
+        self.session = make_session()    # reuses sockets instead of a handshake per call
+        self._tickers = {}               # symbol -> yf.Ticker, reused across calls
+
+    def _ticker(self, symbol):
+        stock = self._tickers.get(symbol)
+        if stock is None:
+            stock = self._tickers.setdefault(symbol, yf.Ticker(symbol, session=self.session))
+        return stock
+
+    def _fetch_expiration(self, stock, exp_date):
+        try:
+            return stock.option_chain(exp_date)
+        except Exception as e:
+            logger.warning("❌ Error fetching %s %s: %s", stock.ticker, exp_date, e)
+            return None
 
     def get_option_chain(self, ticker, max_expiry_days=45):
         try:
-            stock = yf.Ticker(ticker)
+            run_ts = datetime.now()
+            run_date = run_ts.date()
+
+            stock = self._ticker(ticker)
 
             expirations = stock.options
             if not expirations:
-                print(f"No options data available for {ticker}")
+                logger.info("No options data available for %s", ticker)
                 return pd.DataFrame()
 
             if max_expiry_days is not None:
-                cutoff_date = datetime.now() + timedelta(days=max_expiry_days)
+                cutoff_date = run_ts + timedelta(days=max_expiry_days)
                 expirations = [
                     d for d in expirations
                     if datetime.strptime(d, "%Y-%m-%d") <= cutoff_date
                 ]
 
-            print(f"Found {len(expirations)} expiration dates for {ticker}")
+            logger.info("Found %d expiration dates for %s", len(expirations), ticker)
 
-            all_options = []
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                chains = list(executor.map(
+                    lambda d: self._fetch_expiration(stock, d), expirations
+                ))
 
-            for exp_date in expirations:
-                try:
-                    print(f"  -> Fetching expiration {exp_date}")
+            fetched = sum(opt is not None for opt in chains)
+            logger.info("Fetched %d/%d expirations for %s", fetched, len(expirations), ticker)
+
+            all_options = []
 
-                    opt = stock.option_chain(exp_date)
+            for exp_date, opt in zip(expirations, chains):
+                if opt is None:
+                    continue
 
+                # A malformed expiration is skipped on its own instead of failing the ticker
+                try:
                     calls = opt.calls.copy()
+                    puts = opt.puts.copy()
+                    for frame in (calls, puts):
+                        missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+                        if missing:
+                            raise KeyError(f"missing columns {missing}")
+
                     calls["type"] = "CALL"
                     calls["exp_date"] = exp_date
-
-                    puts = opt.puts.copy()
                     puts["type"] = "PUT"
                     puts["exp_date"] = exp_date
-
-                    options = pd.concat([calls, puts], ignore_index=True)
-
-                    options["ticker"] = ticker
-                    options["timestamp"] = datetime.now()
-                    options["snapshot_date"] = datetime.now().date()
-
-                    options = options.rename(columns={
-                        "contractSymbol": "option_code",
-                        "lastPrice": "last_price",
-                        "openInterest": "open_interest",
-                        "impliedVolatility": "iv"
-                    })
-
-                    options["mid_price"] = (options["bid"] + options["ask"]) / 2
-
-                    columns = [
-                        "ticker", "option_code", "strike", "exp_date", "type",
-                        "bid", "ask", "last_price", "mid_price",
-                        "volume", "open_interest", "iv",
-                        "timestamp", "snapshot_date"
-                    ]
-
-                    available_cols = [c for c in columns if c in options.columns]
-                    options = options[available_cols]
-
-                    all_options.append(options)
-
-                    time.sleep(0.2)
-
                 except Exception as e:
-                    print(f"    ❌ Error fetching {exp_date}: {e}")
+                    logger.warning("❌ Error processing %s %s: %s", ticker, exp_date, e)
                     continue
 
+                all_options.append(calls)
+                all_options.append(puts)
+
             if not all_options:
                 return pd.DataFrame()
 
+            # Single concat over every expiration, then post-process once
             df = pd.concat(all_options, ignore_index=True)
 
-            df = df.dropna(subset=["strike"])
-            df["iv"] = df["iv"].fillna(0)
-            df["volume"] = df["volume"].fillna(0).astype(int)
-            df["open_interest"] = df["open_interest"].fillna(0).astype(int)
-
-            print(f"✅ {ticker}: {len(df)} options fetched "
-                  f"(Calls: {len(df[df['type'] == 'CALL'])}, "
-                  f"Puts: {len(df[df['type'] == 'PUT'])})")
+            df.rename(columns={
+                "contractSymbol": "option_code",
+                "lastPrice": "last_price",
+                "openInterest": "open_interest",
+                "impliedVolatility": "iv"
+            }, inplace=True)
+
+            df["ticker"] = ticker
+            df["timestamp"] = run_ts
+            df["snapshot_date"] = run_date
+
+            # Yahoo can send all-integer quotes (e.g. 0 after hours); force float for the in-place scale
+            mid_price = df["bid"].to_numpy(dtype=np.float64) + df["ask"].to_numpy(dtype=np.float64)
+            mid_price *= 0.5
+            df["mid_price"] = mid_price
+
+            columns = [
+                "ticker", "option_code", "strike", "exp_date", "type",
+                "bid", "ask", "last_price", "mid_price",
+                "volume", "open_interest", "iv",
+                "timestamp", "snapshot_date"
+            ]
+
+            available_cols = [c for c in columns if c in df.columns]
+            df = df[available_cols].dropna(subset=["strike"])
+
+            df.fillna({"iv": 0, "volume": 0, "open_interest": 0}, inplace=True)
+            df["exp_date"] = pd.to_datetime(df["exp_date"], format="%Y-%m-%d").dt.date
+            df = df.astype({
+                "ticker": "category",
+                "type": "category",
+                "option_code": "string[pyarrow]",
+                "volume": "int32",
+                "open_interest": "int32"
+            })
+
+            counts = df["type"].value_counts()
+            logger.info("✅ %s: %d options fetched (Calls: %d, Puts: %d)",
+                        ticker, len(df), counts.get("CALL", 0), counts.get("PUT", 0))
 
             return df
 
         except Exception as e:
-            print(f"❌ Error fetching options chain for {ticker}: {e}")
+            logger.error("❌ Error fetching options chain for %s: %s", ticker, e)
             return pd.DataFrame()
 
     def save_to_csv(self, df, filename):
-        df.to_csv(filename, index=False)
-        print(f"💾 Saved {len(df)} records to {filename}")
+        pcsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), filename)
+        logger.info("💾 Saved %d records to %s", len(df), filename)
+
+    def save_to_dataset(self, df, root_path):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_to_dataset(table, root_path=root_path,
+                            partition_cols=["snapshot_date", "ticker"], compression="zstd")
+        logger.info("💾 Saved %d records to %s/", len(df), root_path)
 
 
 # =========================================================
@@ -124,6 +202,11 @@ TICKERS = [
 
 MAX_EXPIRY_DAYS = 45   # change to None for all expiries
 
+MAX_WORKERS = 8        # tickers fetched concurrently
+
+OUTPUT_FORMAT = "parquet"   # or "csv" for one file per ticker
+OUTPUT_DIR = "yf_options"   # parquet dataset root
+
 
 # =========================================================
 # MAIN EXECUTION
@@ -131,25 +214,32 @@ MAX_EXPIRY_DAYS = 45   # change to None for all expiries
 
 def run_multi_ticker_scrape():
     fetcher = YahooOptionsChainFetcher()
-
-    for ticker in TICKERS:
-        print("\n" + "=" * 70)
-        print(f"Fetching options chain for {ticker}")
-        print("=" * 70)
-
-        df = fetcher.get_option_chain(ticker, max_expiry_days=MAX_EXPIRY_DAYS)
-
-        if not df.empty:
-            run_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{ticker}_{run_ts}_yf.csv"
-            fetcher.save_to_csv(df, filename)
-        else:
-            print(f"⚠️ No data retrieved for {ticker}")
-
-        time.sleep(1)
+    run_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for ticker in TICKERS:
+            logger.info("Fetching options chain for %s", ticker)
+            future = executor.submit(
+                fetcher.get_option_chain, ticker, max_expiry_days=MAX_EXPIRY_DAYS
+            )
+            futures[future] = ticker
+
+        for future in as_completed(futures):
+            ticker = futures[future]
+            df = future.result()
+
+            if df.empty:
+                logger.warning("⚠️ No data retrieved for %s", ticker)
+            elif OUTPUT_FORMAT == "csv":
+                filename = f"{ticker}_{run_ts}_yf.csv"
+                fetcher.save_to_csv(df, filename)
+            else:
+                fetcher.save_to_dataset(df, OUTPUT_DIR)
 
 
 if __name__ == "__main__":
-    print("🚀 Options Chain Multi-Ticker Scraper Started")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logger.info("🚀 Options Chain Multi-Ticker Scraper Started")
     run_multi_ticker_scrape()
-    print("\n✅ All tickers processed")
+    logger.info("✅ All tickers processed")